@@ -0,0 +1,11 @@
+from typing import Literal, Annotated
+from pydantic import BaseModel, conint
+
+class ServeTTSRequest(BaseModel):
+    text: str
+    reference_id: str = "57eab548c7ed4ddc974c4c153cb015b2"
+    chunk_length: Annotated[int, conint(ge=100, le=300, strict=True)] = 200
+    format: Literal["wav", "pcm", "mp3"] = "mp3"
+    mp3_bitrate: Literal[64, 128, 192] = 192
+    normalize: bool = True
+    latency: Literal["normal", "balanced"] = "normal"
@@ -1,46 +1,65 @@
-import feedparser
-import requests
-from bs4 import BeautifulSoup
 from datetime import datetime, timedelta, timezone
 import time
 import json
 import asyncio
 import os
-from typing import List, Dict, Literal, Annotated
+from typing import List, Dict
 import shutil
-import httpx
-import ormsgpack
-from pydantic import BaseModel, conint
-import aiohttp
 import random
+import hashlib
+import heapq
+import re
+from email.utils import parsedate_to_datetime
+from contextlib import contextmanager
 
-class ServeTTSRequest(BaseModel):
-    text: str
-    reference_id: str = "57eab548c7ed4ddc974c4c153cb015b2"
-    chunk_length: Annotated[int, conint(ge=100, le=300, strict=True)] = 200
-    format: Literal["wav", "pcm", "mp3"] = "mp3"
-    mp3_bitrate: Literal[64, 128, 192] = 192
-    normalize: bool = True
-    latency: Literal["normal", "balanced"] = "normal"
+# 第三方依赖（feedparser、requests、bs4、aiohttp、httpx、ormsgpack、pydantic）
+# 都在各阶段内部按需导入，这样缓存维护、重新渲染、重建索引等命令可以快速启动，
+# 并且不需要安装或配置用不到的依赖和密钥。
 
 class PodcastGenerator:
     def __init__(self):
         self.rss_url = "https://supsub.net/feed/f4caffa2-d32a-431f-b987-c42b239a29ec/groups/837/rss"
-        # 从环境变量获取 API key
+        # 从环境变量获取 API key，只在需要的阶段检查是否设置
         self.api_key = os.environ.get('API_KEY')
-        if not self.api_key:
-            raise ValueError("API_KEY environment variable is not set")
         self.api_base = "https://openrouter.ai/api/v1/chat/completions"
+        self.llm_model = "google/gemini-2.0-flash-001"
+        self.llm_fallback_model = os.environ.get('LLM_FALLBACK_MODEL')  # 对冲请求使用的备用模型，可选
+        # 免费版每分钟的调用上限，其中 llm_hedges_per_minute 次留给对冲请求，其余用于总结；按进程分别计算
+        self.llm_calls_per_minute = 20
+        self.llm_hedges_per_minute = 5
+        self.summary_calls_per_minute = self.llm_calls_per_minute - self.llm_hedges_per_minute
+        self.llm_latency_file = "llm_latency.json"  # 跨运行保存的大模型耗时样本
+        self._llm_client = None
+        self._script_requests = {}  # 提示词 -> 生成播报稿的请求，供只有音色或码率不同的版本共用
         
         # 所有路径都相对于 main 目录
         self.cache_file = "article_cache.json"
+        self.summary_store_file = "summary_store.json"  # 后台预总结的结果
         self.web_dir = "web"
         self.public_dir = os.path.join(self.web_dir, "public")
         self.podcasts_dir = os.path.join(self.public_dir, "podcasts")
         self.index_file = os.path.join(self.public_dir, "podcast_index.json")
+        self.scoring_file = "scoring.json"  # 文章评分配置，可选
+        self.scoring = {
+            'top_k': 20,  # 每次最多选取的文章数
+            'candidate_pool': 40,  # 堆中保留的候选数，用于补位抓取失败或被过滤的文章
+            'weights': {'recency': 1.0, 'source': 1.0, 'density': 1.0, 'keywords': 1.0},
+            'recency_half_life_hours': 24,
+            'source_weights': {},
+            'default_source_weight': 0.5,
+            'density_target_length': 300,
+            'density_target_numbers': 5,
+            'keyword_boosts': {'出版': 0.3, '图书': 0.3, '畅销': 0.5, '销量': 0.5, '书单': 0.3, '数据': 0.3}
+        }
+        self.episodes_file = "episodes.json"  # 节目版本配置，不存在时只生成完整版
+        self.default_reference_id = "74a543044a7b445696f6fc77a8aafa8d"
+        self.audio_renditions = [128, 64]  # 由主音频转码得到的低码率版本，需要 ffmpeg
         self.fish_api_key = os.environ.get('FISH_API_KEY')
-        if not self.fish_api_key:
-            raise ValueError("FISH_API_KEY environment variable is not set")
+        self.staging_dir = "staging"  # 分阶段运行时的中间结果，不发布
+        self.staged_articles_file = os.path.join(self.staging_dir, "articles.json")
+        self.body_store_dir = os.path.join(self.staging_dir, "bodies")  # 按内容哈希存放的文章原文
+        self.publish_manifest_file = os.path.join(self.staging_dir, "publish_manifest.json")  # 待发布的文件
+        self.static_public_files = ["index.html"]  # 不由生成器写出、每次同步时检查的网页文件
         
         # 确保必要的目录存在
         for directory in [self.web_dir, self.public_dir, self.podcasts_dir]:
@@ -53,6 +72,39 @@ class PodcastGenerator:
             'Accept': 'application/rss+xml,application/xml;q=0.9,*/*;q=0.8'
         }
 
+        # 后台模式配置：轮询间隔(秒)
+        self.daemon_poll_interval = 1800
+
+    def require_api_key(self) -> str:
+        """总结和生成播报稿阶段需要 API_KEY"""
+        if not self.api_key:
+            raise ValueError("API_KEY environment variable is not set")
+        return self.api_key
+
+    def require_fish_api_key(self) -> str:
+        """生成音频阶段需要 FISH_API_KEY"""
+        if not self.fish_api_key:
+            raise ValueError("FISH_API_KEY environment variable is not set")
+        return self.fish_api_key
+
+    def get_llm_client(self):
+        """返回共享的大模型客户端，在同一进程内累积耗时统计和熔断状态"""
+        if self._llm_client is None:
+            from llm_client import HedgedLLMClient
+
+            self._llm_client = HedgedLLMClient(
+                self.api_base, self.require_api_key(), self.llm_model, self.llm_fallback_model,
+                max_hedges_per_minute=self.llm_hedges_per_minute
+            )
+            self._llm_client.load_latency_samples(self.llm_latency_file)
+        return self._llm_client
+
+    def report_llm_stats(self):
+        """打印对冲请求的统计信息，并保存耗时样本供之后的运行使用"""
+        if self._llm_client is not None:
+            print(self._llm_client.report())
+            self._llm_client.save_latency_samples(self.llm_latency_file)
+
     def load_cache(self) -> Dict:
         """加载文章缓存，并清理过期内容"""
         try:
@@ -69,17 +121,7 @@ class PodcastGenerator:
                     print(f"- {article.get('data', {}).get('title', 'No title')}")
                 
                 # 清理7天前的缓存
-                current_time = datetime.now()
-                cleaned_cache = {'articles': {}}
-                
-                for url, article_data in cache['articles'].items():
-                    try:
-                        article_time = datetime.strptime(article_data['timestamp'], '%Y-%m-%d %H:%M:%S')
-                        if (current_time - article_time).days < 7:
-                            cleaned_cache['articles'][url] = article_data
-                    except Exception as e:
-                        print(f"清理缓存条目时出错: {e}")
-                        continue
+                cleaned_cache = self.prune_cache(cache)
                 
                 print(f"已加载缓存，包含 {len(cleaned_cache['articles'])} 个有效条目")
                 return cleaned_cache
@@ -90,8 +132,39 @@ class PodcastGenerator:
             print(f"加载缓存失败: {e}")
             return {'articles': {}}
 
-    def save_cache(self, cache: Dict):
-        """保存文章缓存"""
+    def prune_cache(self, cache: Dict) -> Dict:
+        """返回只包含7天内条目的缓存"""
+        current_time = datetime.now()
+        cleaned_cache = {'articles': {}}
+        
+        for url, article_data in cache['articles'].items():
+            try:
+                article_time = datetime.strptime(article_data['timestamp'], '%Y-%m-%d %H:%M:%S')
+                if (current_time - article_time).days < 7:
+                    cleaned_cache['articles'][url] = article_data
+            except Exception as e:
+                print(f"清理缓存条目时出错: {e}")
+                continue
+        return cleaned_cache
+
+    @contextmanager
+    def file_lock(self, path: str):
+        """用 path.lock 加独占锁，防止后台进程和每日构建同时读改写同一个文件"""
+        import fcntl
+
+        with open(path + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def save_cache(self, cache: Dict, removed_urls: List[str] = None):
+        """保存文章缓存
+
+        保存前在锁内重新读取磁盘上的缓存并合并，保留其他进程（如后台模式）在此期间写入的条目，
+        removed_urls 中的条目会被删除。合并后的结果同时写回传入的 cache。
+        """
         try:
             print(f"当前工作目录: {os.getcwd()}")
             print(f"缓存文件路径: {os.path.abspath(self.cache_file)}")
@@ -103,8 +176,20 @@ class PodcastGenerator:
                 os.makedirs(cache_dir)
                 print(f"创建缓存目录: {cache_dir}")
             
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump(cache, f, ensure_ascii=False, indent=2)
+            with self.file_lock(self.cache_file):
+                merged = {'articles': {}}
+                if os.path.exists(self.cache_file):
+                    with open(self.cache_file, 'r', encoding='utf-8') as f:
+                        merged['articles'].update(json.load(f).get('articles', {}))
+                merged['articles'].update(cache['articles'])
+                for url in removed_urls or []:
+                    merged['articles'].pop(url, None)
+                cache['articles'] = self.prune_cache(merged)['articles']
+
+                tmp_file = self.cache_file + '.tmp'
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    json.dump(cache, f, ensure_ascii=False, indent=2)
+                os.replace(tmp_file, self.cache_file)
             
             # 验证文件是否成功写入
             if os.path.exists(self.cache_file):
@@ -118,8 +203,355 @@ class PodcastGenerator:
             import traceback
             print(traceback.format_exc())
 
+    def load_summary_store(self) -> Dict:
+        """加载已预先总结的文章，并清理7天前已播出的条目"""
+        try:
+            if os.path.exists(self.summary_store_file):
+                with open(self.summary_store_file, 'r', encoding='utf-8') as f:
+                    cleaned_store = self.prune_summary_store(json.load(f))
+
+                pending = sum(1 for e in cleaned_store['summaries'].values() if e.get('status') == 'pending')
+                print(f"已加载总结存储，包含 {len(cleaned_store['summaries'])} 个条目，其中 {pending} 个待播出")
+                return cleaned_store
+
+            return {'summaries': {}}
+        except Exception as e:
+            print(f"加载总结存储失败: {e}")
+            return {'summaries': {}}
+
+    def prune_summary_store(self, store: Dict) -> Dict:
+        """返回去掉7天前已播出条目后的总结存储，待播出的条目始终保留"""
+        current_time = datetime.now()
+        cleaned_store = {'summaries': {}}
+        for url, entry in store.get('summaries', {}).items():
+            try:
+                entry_time = datetime.strptime(entry['timestamp'], '%Y-%m-%d %H:%M:%S')
+                if entry.get('status') == 'pending' or (current_time - entry_time).days < 7:
+                    cleaned_store['summaries'][url] = entry
+            except Exception as e:
+                print(f"清理总结存储条目时出错: {e}")
+                continue
+        return cleaned_store
+
+    def save_summary_store(self, store: Dict):
+        """保存总结存储
+
+        在锁内重新读取磁盘上的存储并合并，保留后台进程在此期间新增的总结：
+        任一方已标记为已播出的条目视为已播出，节目记录取并集。合并结果同时写回传入的 store。
+        先写临时文件再替换，避免进程中断时损坏文件。
+        """
+        try:
+            with self.file_lock(self.summary_store_file):
+                merged = {'summaries': {}}
+                if os.path.exists(self.summary_store_file):
+                    with open(self.summary_store_file, 'r', encoding='utf-8') as f:
+                        merged['summaries'].update(json.load(f).get('summaries', {}))
+
+                for url, entry in store['summaries'].items():
+                    disk_entry = merged['summaries'].get(url)
+                    if disk_entry:
+                        if disk_entry.get('status') == 'used':
+                            entry['status'] = 'used'
+                        episodes = {**disk_entry.get('episodes', {}), **entry.get('episodes', {})}
+                        if episodes:
+                            entry['episodes'] = episodes
+                        entry['timestamp'] = max(entry['timestamp'], disk_entry['timestamp'])
+                    merged['summaries'][url] = entry
+                store['summaries'] = self.prune_summary_store(merged)['summaries']
+
+                tmp_file = self.summary_store_file + '.tmp'
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    json.dump(store, f, ensure_ascii=False, indent=2)
+                os.replace(tmp_file, self.summary_store_file)
+        except Exception as e:
+            print(f"保存总结存储失败: {e}")
+
+    def add_summary_to_store(self, summary: Dict, store: Dict):
+        """将一篇文章的总结记为待播出"""
+        store['summaries'][summary['link']] = {
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'status': 'pending',
+            'data': summary
+        }
+
+    def get_pending_summaries(self, store: Dict) -> List[Dict]:
+        """按总结时间顺序返回所有待播出的总结"""
+        entries = [e for e in store['summaries'].values() if e.get('status') == 'pending']
+        entries.sort(key=lambda e: e['timestamp'])
+        return [e['data'] for e in entries]
+
+    def get_episode_summaries(self, store: Dict, episode_id: str) -> List[Dict]:
+        """返回某一期节目使用过的总结，用于重新渲染和重建索引"""
+        entries = [e for e in store['summaries'].values() if episode_id in e.get('episodes', {})]
+        entries.sort(key=lambda e: e['episodes'][episode_id])
+        return [e['data'] for e in entries]
+
+    def episode_article_count(self, store: Dict, episode_id: str) -> int:
+        """某一期节目的文章数
+
+        优先使用总结存储中的记录；早于总结存储的节目或记录已被清理时，
+        从 summary.txt 的“今天总结了 N 篇文章”中读取，都没有时返回 None。
+        """
+        summaries = self.get_episode_summaries(store, episode_id)
+        if summaries:
+            return len(summaries)
+
+        summary_file = os.path.join(self.podcasts_dir, episode_id, 'summary.txt')
+        if os.path.exists(summary_file):
+            with open(summary_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    match = re.match(r'今天总结了\s*(\d+)\s*篇文章', line.strip())
+                    if match:
+                        return int(match.group(1))
+        return None
+
+    def save_staged_articles(self, articles: List[Dict]):
+        """保存 fetch 阶段获取的文章，供 summarize 阶段使用"""
+        if not os.path.exists(self.staging_dir):
+            os.makedirs(self.staging_dir)
+        with open(self.staged_articles_file, 'w', encoding='utf-8') as f:
+            json.dump(articles, f, ensure_ascii=False, indent=2)
+        print(f"已暂存 {len(articles)} 篇文章到 {self.staged_articles_file}")
+
+    def load_staged_articles(self) -> List[Dict]:
+        """读取 fetch 阶段暂存的文章"""
+        if not os.path.exists(self.staged_articles_file):
+            return []
+        with open(self.staged_articles_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def latest_timestamp(self) -> str:
+        """返回最近一次运行的时间戳（不含版本后缀）"""
+        timestamps = [d[:15] for d in os.listdir(self.podcasts_dir)
+                      if os.path.isdir(os.path.join(self.podcasts_dir, d))]
+        return max(timestamps) if timestamps else None
+
+    def load_episode_variants(self) -> List[Dict]:
+        """加载节目版本配置
+
+        每个版本可以设置 name、title、prompt 或 prompt_file、max_articles、sources、
+        reference_id 和 mp3_bitrate。第一个版本为主版本，输出到 podcasts/<时间戳>/，
+        其余版本输出到 podcasts/<时间戳>_<name>/。
+        """
+        variants = [{'name': 'full'}]
+        if os.path.exists(self.episodes_file):
+            try:
+                with open(self.episodes_file, 'r', encoding='utf-8') as f:
+                    loaded = json.load(f).get('variants') or variants
+                # name 用作输出目录后缀和索引中的版本名，必须存在、唯一且可作为目录名
+                names = [v.get('name') for v in loaded]
+                for name in names:
+                    if not isinstance(name, str) or not re.fullmatch(r'[A-Za-z0-9_-]+', name):
+                        raise ValueError(f"版本名 {name!r} 无效，只能包含字母、数字、下划线和连字符")
+                    if names.count(name) > 1:
+                        raise ValueError(f"版本名 {name} 重复")
+                variants = loaded
+            except Exception as e:
+                print(f"加载节目版本配置失败，只生成完整版: {e}")
+
+        for i, variant in enumerate(variants):
+            variant['episode_suffix'] = '' if i == 0 else f"_{variant['name']}"
+        return variants
+
+    def variant_episode_id(self, timestamp: str, variant: Dict) -> str:
+        """某个版本在本次运行中的节目 ID，同时也是它的输出目录名"""
+        return f"{timestamp}{variant['episode_suffix']}"
+
+    def variant_for_episode(self, episode_id: str) -> Dict:
+        """根据节目 ID 的后缀找到对应的版本配置"""
+        variants = self.load_episode_variants()
+        for variant in variants:
+            if episode_id[15:] == variant['episode_suffix']:
+                return variant
+        return variants[0]
+
+    def episode_ids_for_run(self, timestamp: str = None) -> List[str]:
+        """返回某次运行（默认为最近一次）已生成的所有版本的节目 ID"""
+        if timestamp and len(timestamp) > 15:
+            return [timestamp]
+        timestamp = timestamp or self.latest_timestamp()
+        if not timestamp:
+            return []
+        episode_ids = [self.variant_episode_id(timestamp, v) for v in self.load_episode_variants()]
+        return [e for e in episode_ids if os.path.isdir(os.path.join(self.podcasts_dir, e))]
+
+    def select_variant_summaries(self, summaries: List[Dict], variant: Dict) -> List[Dict]:
+        """按版本配置筛选文章：限定来源并选取得分最高的 max_articles 篇
+
+        未设置 max_articles 时按评分配置的 top_k 截取，待播出的总结可能来自多次抓取，
+        每次抓取各自的 top_k 加起来会超过一期节目的篇数。
+        """
+        selected = summaries
+        if variant.get('sources'):
+            selected = [s for s in selected if s.get('source') in variant['sources']]
+        limit = variant.get('max_articles') or self.load_scoring_config()['top_k']
+        return sorted(selected, key=lambda s: s.get('score') or 0, reverse=True)[:limit]
+
+    def mark_summaries_used(self, summaries: List[Dict], store: Dict):
+        """将已经参与生成节目的总结标记为已播出"""
+        for s in summaries:
+            entry = store['summaries'].get(s['link'])
+            if entry:
+                entry['status'] = 'used'
+                entry['timestamp'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    def record_episode_summaries(self, summaries: List[Dict], store: Dict, episode_id: str):
+        """记录某一期节目用到的总结及其顺序，用于重新渲染和重建索引"""
+        for position, s in enumerate(summaries):
+            entry = store['summaries'].get(s['link'])
+            if entry:
+                entry.setdefault('episodes', {})[episode_id] = position
+
+    def record_variant_results(self, summaries: List[Dict], results: List[Dict], store: Dict) -> bool:
+        """记录各版本用到的总结
+
+        只有主版本成功时才记录并把本次的总结标记为已播出；主版本失败时总结仍为待播出，
+        其他版本也不发布，重新运行时所有版本一起重新生成。返回主版本是否成功。
+        因 top_k 截取而未入选的总结也一并标记，不会在之后的节目中作为旧闻再次出现。
+        """
+        if not results[0]:
+            return False
+        for r in results:
+            if r:
+                self.record_episode_summaries(r['summaries'], store, r['podcast_data']['id'])
+        self.mark_summaries_used(summaries, store)
+        return True
+
+    def store_article_body(self, content: str) -> str:
+        """将文章原文写入按内容哈希寻址的磁盘存储，返回内容 ID"""
+        content_id = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        body_file = self.article_body_path(content_id)
+        if not os.path.exists(body_file):
+            body_dir = os.path.dirname(body_file)
+            if not os.path.exists(body_dir):
+                os.makedirs(body_dir)
+            tmp_file = body_file + '.tmp'
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(tmp_file, body_file)
+        return content_id
+
+    def article_body_path(self, content_id: str) -> str:
+        """内容 ID 对应的原文文件路径，按前两位分目录避免单个目录文件过多"""
+        return os.path.join(self.body_store_dir, content_id[:2], f"{content_id}.txt")
+
+    def read_article_body(self, article: Dict) -> str:
+        """读取文章原文，兼容旧数据中直接内嵌的 content 字段"""
+        content_id = article.get('content_id')
+        if content_id and os.path.exists(self.article_body_path(content_id)):
+            with open(self.article_body_path(content_id), 'r', encoding='utf-8') as f:
+                return f.read()
+        return article.get('content', '未获取到原文')
+
+    def copy_article_body(self, article: Dict, f_out):
+        """将文章原文以流的方式写入已打开的文件，不整篇读入内存"""
+        content_id = article.get('content_id')
+        if content_id and os.path.exists(self.article_body_path(content_id)):
+            with open(self.article_body_path(content_id), 'r', encoding='utf-8') as f_in:
+                shutil.copyfileobj(f_in, f_out)
+        else:
+            f_out.write(article.get('content', '未获取到原文'))
+
+    def prune_article_bodies(self, store: Dict):
+        """删除不再被总结存储或暂存文章引用、且超过1天的原文文件"""
+        if not os.path.exists(self.body_store_dir):
+            return
+
+        referenced = {e['data'].get('content_id') for e in store['summaries'].values()}
+        referenced.update(a.get('content_id') for a in self.load_staged_articles())
+
+        removed = 0
+        cutoff = time.time() - 86400  # 后台进程可能正在使用刚写入的文件
+        for root, _, files in os.walk(self.body_store_dir):
+            for name in files:
+                content_id = name.split('.')[0]
+                body_file = os.path.join(root, name)
+                if content_id not in referenced and os.path.getmtime(body_file) < cutoff:
+                    os.remove(body_file)
+                    removed += 1
+        print(f"已清理 {removed} 个不再使用的原文文件")
+
+    def file_sha256(self, path: str) -> str:
+        """分块计算文件的 SHA-256，避免将大音频文件整个读入内存"""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def load_publish_manifest(self) -> Dict:
+        """加载发布清单：自上次同步以来生成或修改的文件及其内容哈希"""
+        if os.path.exists(self.publish_manifest_file):
+            with open(self.publish_manifest_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {'files': {}}
+
+    def record_published_files(self, paths: List[str]):
+        """将 public 目录下新生成或修改的文件记入发布清单"""
+        manifest = self.load_publish_manifest()
+        for path in paths:
+            relpath = os.path.relpath(path, self.public_dir).replace(os.sep, '/')
+            manifest['files'][relpath] = {
+                'sha256': self.file_sha256(path),
+                'size': os.path.getsize(path),
+                'updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            }
+
+        if not os.path.exists(self.staging_dir):
+            os.makedirs(self.staging_dir)
+        tmp_file = self.publish_manifest_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.publish_manifest_file)
+
+    def sync_published_files(self, target_dir: str, keep_manifest: bool = False) -> Dict[str, List[str]]:
+        """只把发布清单中新增或内容有变化的文件复制到目标目录
+
+        耗时只取决于本次生成的文件数量，与历史节目的多少无关。
+        源文件已被删除的条目只报告不复制，并随其他已同步的条目一起从清单中清除，
+        否则清单会一直无法清空，每次同步都重新比较全部历史文件。
+        """
+        manifest = self.load_publish_manifest()
+        report = {'new': [], 'changed': [], 'unchanged': [], 'missing': []}
+
+        for relpath, entry in sorted(manifest['files'].items()):
+            source = os.path.join(self.public_dir, relpath)
+            target = os.path.join(target_dir, relpath)
+            if not os.path.exists(source):
+                report['missing'].append(relpath)
+                continue
+
+            if os.path.exists(target):
+                if self.file_sha256(target) == entry['sha256']:
+                    report['unchanged'].append(relpath)
+                    continue
+                report['changed'].append(relpath)
+            else:
+                report['new'].append(relpath)
+
+            target_parent = os.path.dirname(target)
+            if target_parent and not os.path.exists(target_parent):
+                os.makedirs(target_parent)
+            shutil.copy2(source, target)
+
+        for key, label in [('new', '新增'), ('changed', '修改'), ('unchanged', '未变化'), ('missing', '源文件缺失')]:
+            print(f"{label}: {len(report[key])} 个文件")
+            if key in ('new', 'changed', 'missing'):
+                for relpath in report[key]:
+                    print(f"  {relpath}")
+
+        if not keep_manifest:
+            os.remove(self.publish_manifest_file)
+        return report
+
     def update_podcast_index(self, podcast_data):
         """更新播客索引文件"""
+        self.update_podcast_index_entries([podcast_data])
+
+    def update_podcast_index_entries(self, podcast_entries: List[Dict]):
+        """一次性将多期节目写入播客索引，列表中靠前的节目排在索引前面"""
+        import requests
+
         try:
             print(f"\n正在更新索引文件: {self.index_file}")
             
@@ -137,29 +569,37 @@ class PodcastGenerator:
                 print(f"获取现有索引失败: {e}")
                 index = {'podcasts': []}
 
-            # 构建新的播客数据
-            new_podcast = {
-                'id': podcast_data['id'],
-                'date': podcast_data['date'],
-                'title': podcast_data['title'],
-                'transcript_path': podcast_data['transcript_path'],  # 使用传入的路径，不再硬编码
-                'audio_path': podcast_data.get('audio_path'),  # 使用传入的路径
-                'highlight': podcast_data.get('highlight', "探索出版行业的最新动态，聆听行业专家的深度解析")  # 添加副标题，如果没有则使用默认值
-            }
-            
-            # 打印调试信息
-            print(f"新播客数据: {new_podcast}")
-            
-            # 添加新播客信息到列表开头
-            index['podcasts'].insert(0, new_podcast)
+            for podcast_data in reversed(podcast_entries):
+                # 构建新的播客数据
+                new_podcast = {
+                    'id': podcast_data['id'],
+                    'date': podcast_data['date'],
+                    'title': podcast_data['title'],
+                    'transcript_path': podcast_data['transcript_path'],  # 使用传入的路径，不再硬编码
+                    'audio_path': podcast_data.get('audio_path'),  # 使用传入的路径
+                    'highlight': podcast_data.get('highlight', "探索出版行业的最新动态，聆听行业专家的深度解析")  # 添加副标题，如果没有则使用默认值
+                }
+                if podcast_data.get('audio_renditions'):
+                    new_podcast['audio_renditions'] = podcast_data['audio_renditions']
+                if podcast_data.get('variant'):
+                    new_podcast['variant'] = podcast_data['variant']
+                
+                # 打印调试信息
+                print(f"新播客数据: {new_podcast}")
+                
+                # 重新生成同一期节目时替换旧条目，然后添加到列表开头
+                index['podcasts'] = [p for p in index['podcasts'] if p.get('id') != new_podcast['id']]
+                index['podcasts'].insert(0, new_podcast)
             
-            # 只保留最近50期
-            index['podcasts'] = index['podcasts'][:50]
+            # 只保留最近50期，同一次运行的各版本（ID 前 15 位相同）算作一期
+            recent_runs = set(list(dict.fromkeys(p['id'][:15] for p in index['podcasts']))[:50])
+            index['podcasts'] = [p for p in index['podcasts'] if p['id'][:15] in recent_runs]
             
             # 保存更新后的索引
             with open(self.index_file, 'w', encoding='utf-8') as f:
                 json.dump(index, f, ensure_ascii=False, indent=2)
             
+            self.record_published_files([self.index_file])
             print(f"索引文件已更新，现在包含 {len(index['podcasts'])} 个播客")
                 
         except Exception as e:
@@ -167,23 +607,71 @@ class PodcastGenerator:
             import traceback
             print(traceback.format_exc())
 
-    async def generate_audio(self, text: str, timestamp: str) -> str:
-        """使用 Fish Audio TTS 生成音频"""
+    async def generate_audio(self, text: str, timestamp: str, reference_id: str = None, mp3_bitrate: int = 192,
+                             renditions: List[int] = None) -> str:
+        """使用 Fish Audio TTS 生成音频
+
+        主码率保存为 podcast.mp3。renditions 中低于主码率的各码率由 podcast.mp3 并发转码为
+        podcast_<码率>k.mp3，供低带宽的听众使用：每期节目只调用一次 TTS，各码率的内容完全相同。
+        """
         print("开始生成音频...")
+        podcast_dir = os.path.join(self.podcasts_dir, timestamp)
+        if not os.path.exists(podcast_dir):
+            os.makedirs(podcast_dir)
+
+        if renditions is None:
+            renditions = self.audio_renditions
+        extra_bitrates = [b for b in renditions if b < mp3_bitrate]
+
+        audio_file = os.path.join(podcast_dir, 'podcast.mp3')
+        if not await self.synthesize_audio(text, audio_file, reference_id, mp3_bitrate):
+            return None
+
+        if extra_bitrates and not shutil.which('ffmpeg'):
+            print("未找到 ffmpeg，只生成主码率音频")
+            extra_bitrates = []
+        renditions = await asyncio.gather(*[
+            self.transcode_audio(audio_file, self.rendition_file(podcast_dir, bitrate), bitrate)
+            for bitrate in extra_bitrates
+        ])
+        renditions = [r for r in renditions if r]
+
+        self.record_published_files([audio_file] + renditions)
+        print(f"✅ 音频文件已保存到: {audio_file}，另有 {len(renditions)} 个低码率版本")
+        return audio_file
+
+    def rendition_file(self, podcast_dir: str, bitrate: int) -> str:
+        """低码率版本的音频文件路径"""
+        return os.path.join(podcast_dir, f'podcast_{bitrate}k.mp3')
+
+    async def transcode_audio(self, source_file: str, audio_file: str, bitrate: int) -> str:
+        """用 ffmpeg 将主音频转码为指定码率，失败时删除不完整的文件"""
+        process = await asyncio.create_subprocess_exec(
+            'ffmpeg', '-y', '-loglevel', 'error', '-i', source_file, '-b:a', f'{bitrate}k', audio_file,
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+        )
+        _, stderr = await process.communicate()
+        if process.returncode != 0:
+            print(f"转码 {bitrate}kbps 音频失败: {stderr.decode('utf-8', 'replace').strip()}")
+            if os.path.exists(audio_file):
+                os.remove(audio_file)
+            return None
+        return audio_file
+
+    async def synthesize_audio(self, text: str, audio_file: str, reference_id: str, mp3_bitrate: int) -> str:
+        """调用 Fish Audio TTS 以指定码率生成一个音频文件，失败时删除不完整的文件"""
+        import httpx
+        import ormsgpack
+        from fish_tts import ServeTTSRequest
+
         try:
-            podcast_dir = os.path.join(self.podcasts_dir, timestamp)
-            if not os.path.exists(podcast_dir):
-                os.makedirs(podcast_dir)
-            
             request = ServeTTSRequest(
                 text=text,
-                reference_id="74a543044a7b445696f6fc77a8aafa8d",
-                mp3_bitrate=192,
+                reference_id=reference_id or self.default_reference_id,
+                mp3_bitrate=mp3_bitrate,
                 normalize=True,
                 latency="normal"
             )
-
-            audio_file = os.path.join(podcast_dir, 'podcast.mp3')
             
             async with httpx.AsyncClient() as client:
                 async with client.stream(
@@ -191,7 +679,7 @@ class PodcastGenerator:
                     "https://api.fish.audio/v1/tts",
                     content=ormsgpack.packb(request, option=ormsgpack.OPT_SERIALIZE_PYDANTIC),
                     headers={
-                        "authorization": f"Bearer {self.fish_api_key}",
+                        "authorization": f"Bearer {self.require_fish_api_key()}",
                         "content-type": "application/msgpack",
                     },
                     timeout=None,
@@ -200,14 +688,18 @@ class PodcastGenerator:
                         async for chunk in response.aiter_bytes():
                             f.write(chunk)
             
-            print(f"✅ 音频文件已保存到: {audio_file}")
             return audio_file
         except Exception as e:
-            print(f"生成音频失败: {e}")
+            print(f"生成 {mp3_bitrate}kbps 音频失败: {e}")
+            if os.path.exists(audio_file):
+                os.remove(audio_file)
             return None
 
     def fetch_article_content(self, url, max_retries=3):
         """获取文章内容"""
+        import requests
+        from bs4 import BeautifulSoup
+
         print(f"\n正在处理URL: {url}")
         
         for attempt in range(max_retries):
@@ -341,18 +833,92 @@ class PodcastGenerator:
             }
         }
         
+        # 记录评分，便于调整权重
+        if 'score' in article:
+            cache['articles'][url]['score'] = article['score']
+            cache['articles'][url]['score_detail'] = article.get('score_detail', {})
+
         # 如果有过滤原因,添加标记
         if filter_reason:
             cache['articles'][url]['filter_reason'] = filter_reason
 
-    def fetch_rss_articles(self, num_pages=5):
-        """获取RSS文章列表，支持多页获取和去重"""
+    def load_scoring_config(self) -> Dict:
+        """加载文章评分配置，scoring.json 中的字段覆盖默认值"""
+        config = dict(self.scoring)
+        if os.path.exists(self.scoring_file):
+            try:
+                with open(self.scoring_file, 'r', encoding='utf-8') as f:
+                    for key, value in json.load(f).items():
+                        # weights、source_weights 等字典只覆盖给出的项
+                        if isinstance(value, dict) and isinstance(config.get(key), dict):
+                            value = {**config[key], **value}
+                        config[key] = value
+            except Exception as e:
+                print(f"加载评分配置失败，使用默认配置: {e}")
+        return config
+
+    def score_article(self, article: Dict, description: str, config: Dict) -> tuple[float, Dict]:
+        """只用 RSS 中已有的信息为文章打分，不抓取原文也不调用大模型
+
+        Returns:
+            tuple: (总分, 各项得分)
+        """
+        # 时效性：按半衰期衰减，无法解析发布时间时取中间值
+        recency = 0.5
+        try:
+            pub_time = parsedate_to_datetime(article['pub_time'])
+            age_hours = max(0.0, (datetime.now(timezone.utc) - pub_time).total_seconds() / 3600)
+            recency = 0.5 ** (age_hours / config['recency_half_life_hours'])
+        except Exception:
+            pass
+
+        # 来源权重
+        source = config['source_weights'].get(article['source'], config['default_source_weight'])
+
+        # 信息密度：摘要长度和其中数字（数据、年份、销量等）的数量
+        text = re.sub(r'<[^>]+>', '', description or '')
+        length_score = min(1.0, len(text) / config['density_target_length'])
+        number_score = min(1.0, len(re.findall(r'\d+(?:\.\d+)?', text)) / config['density_target_numbers'])
+        density = (length_score + number_score) / 2
+
+        # 关键词加分，标题中的关键词计全分，摘要中的计一半
+        keywords = 0.0
+        for keyword, boost in config['keyword_boosts'].items():
+            if keyword in article['title']:
+                keywords += boost
+            elif keyword in text:
+                keywords += boost / 2
+
+        detail = {
+            'recency': round(recency, 3),
+            'source': round(source, 3),
+            'density': round(density, 3),
+            'keywords': round(keywords, 3)
+        }
+        score = sum(config['weights'].get(name, 0) * value for name, value in detail.items())
+        return round(score, 3), detail
+
+    def fetch_rss_articles(self, num_pages=5, top_k: int = None, min_score: float = None):
+        """获取RSS文章列表，支持多页获取和去重
+
+        先用 score_article 为所有新文章打分，只在有界的小顶堆中保留得分最高的候选，
+        然后按得分从高到低抓取原文，直到选中 top_k 篇。排在前面的文章抓取失败或被过滤时，
+        由堆中其余候选依次补上；没有被选中的文章不写入缓存，之后仍可参与评选。
+        给出 min_score 时，得分不高于它的文章不参与本次评选。
+        """
+        import feedparser
+        import requests
+
         try:
             print("开始获取RSS文章...")
             
             articles = []
             cache = self.load_cache()
             seen_urls = set()  # 用于跟踪本次已处理的URL
+            scoring = self.load_scoring_config()
+            top_k = top_k or scoring['top_k']
+            pool_size = max(top_k, scoring['candidate_pool'])
+            candidates = []  # (得分, 序号, 文章) 组成的小顶堆，最多保留 pool_size 篇
             
             # 获取已处理的URL和它们的时间戳
             processed_urls = {}
@@ -394,8 +960,6 @@ class PodcastGenerator:
                         
                         seen_urls.add(entry.link)
                         
-                        print(f"\n处理文章: {entry.get('title', 'No title')}")
-                        
                         # 构建基本文章信息
                         article = {
                             'title': entry.title,
@@ -404,39 +968,54 @@ class PodcastGenerator:
                             'link': entry.link,
                             'pub_time': entry.get('published', datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
                         }
-                        
-                        # 获取文章内容
-                        content = self.fetch_article_content(entry.link)
-                        if content is None:
-                            print(f"获取文章内容失败")
-                            self.save_article_to_cache(article, cache, 'fetch_failed')
-                            continue
-                            
-                        article['content'] = content
-                        
-                        # 检查是否应该跳过
-                        should_skip, reason = self.should_skip_article(article['title'], content)
-                        if should_skip:
-                            print(f"跳过文章，原因: {reason}")
-                            self.save_article_to_cache(article, cache, reason)
+                        article['score'], article['score_detail'] = self.score_article(
+                            article, entry.get('summary', ''), scoring
+                        )
+                        if min_score is not None and article['score'] <= min_score:
                             continue
-                            
-                        articles.append(article)
-                        self.save_article_to_cache(article, cache)
-                        print(f"成功添加文章: {entry.title}")
                         
-                        if len(articles) >= 100:  # 限制最大文章数
-                            print("\n已达到最大文章数限制(100)")
-                            break
-                        
-                        time.sleep(2)  # 避免频繁请求
-                    
-                    if len(articles) >= 100:
-                        break
+                        item = (article['score'], len(seen_urls), article)
+                        if len(candidates) < pool_size:
+                            heapq.heappush(candidates, item)
+                        else:
+                            heapq.heappushpop(candidates, item)
                         
                 except Exception as e:
                     print(f"尝试URL失败: {e}")
                     continue
+            
+            ranked = [item[2] for item in sorted(candidates, key=lambda item: (-item[0], item[1]))]
+            print(f"\n共 {len(seen_urls)} 篇新文章，按得分选取前 {top_k} 篇")
+            
+            for article in ranked:
+                print(f"\n处理文章: {article['title']} (得分 {article['score']})")
+                
+                # 获取文章内容
+                content = self.fetch_article_content(article['link'])
+                if content is None:
+                    print(f"获取文章内容失败")
+                    self.save_article_to_cache(article, cache, 'fetch_failed')
+                    continue
+                    
+                # 检查是否应该跳过
+                should_skip, reason = self.should_skip_article(article['title'], content)
+                if should_skip:
+                    print(f"跳过文章，原因: {reason}")
+                    self.save_article_to_cache(article, cache, reason)
+                    continue
+                
+                # 原文写入磁盘，列表中只保留引用，内存占用不随文章数量增长
+                article['content_id'] = self.store_article_body(content)
+                    
+                articles.append(article)
+                self.save_article_to_cache(article, cache)
+                print(f"成功添加文章: {article['title']}")
+                
+                if len(articles) >= top_k:
+                    print(f"\n已选满 {top_k} 篇文章")
+                    break
+                
+                time.sleep(2)  # 避免频繁请求
                 
             # 保存更新后的缓存
             self.save_cache(cache)
@@ -450,8 +1029,12 @@ class PodcastGenerator:
 
     async def summarize_single_article(self, article: Dict) -> Dict:
         """异步总结单篇文章，带重试机制"""
+        import aiohttp
+        from llm_client import LLMRequestError
+
         max_retries = 3
         retry_delay = 5  # 秒
+        content = self.read_article_body(article)
         
         for attempt in range(max_retries):
             try:
@@ -473,54 +1056,34 @@ class PodcastGenerator:
 
 文章标题：{article['title']}
 作者：{article['author']}
-内容：{article['content']}"""
+内容：{content}"""
 
-                headers = {
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json"
-                }
-                
                 async with aiohttp.ClientSession() as session:
-                    async with session.post(
-                        self.api_base,
-                        headers=headers,
-                        json={
-                            "model": "google/gemini-2.0-flash-001",
-                            "messages": [{"role": "user", "content": prompt}]
-                        },
-                        timeout=30
-                    ) as response:
-                        result = await response.json()
-                        
-                        # 处理速率限制错误
-                        if 'error' in result and result['error'].get('code') == 429:
-                            if attempt < max_retries - 1:
-                                wait_time = retry_delay * (attempt + 1)
-                                print(f"遇到速率限制，等待 {wait_time} 秒后重试...")
-                                await asyncio.sleep(wait_time)
-                                continue
-                            else:
-                                print("达到最大重试次数，跳过此文章")
-                                return None
-                        
-                        # 处理正常响应
-                        if 'choices' in result:
-                            summary = result["choices"][0]["message"]["content"].strip()
-                        elif 'response' in result:
-                            summary = result["response"].strip()
-                        else:
-                            print(f"API响应格式异常: {result}")
-                            return None
-                        
-                        return {
-                            'title': article['title'],
-                            'summary': summary,
-                            'source': article.get('source', '未知来源'),
-                            'pub_time': article.get('pub_time', ''),
-                            'link': article.get('link', ''),
-                            'content': article.get('content', '')
-                        }
-                        
+                    summary = await self.get_llm_client().complete(session, prompt, timeout=30, kind='summary')
+
+                return {
+                    'title': article['title'],
+                    'summary': summary,
+                    'source': article.get('source', '未知来源'),
+                    'pub_time': article.get('pub_time', ''),
+                    'link': article.get('link', ''),
+                    'content_id': article.get('content_id'),
+                    'score': article.get('score')
+                }
+
+            except LLMRequestError as e:
+                # 处理速率限制错误
+                if not e.rate_limited:
+                    print(f"API响应格式异常: {e}")
+                    return None
+                if attempt < max_retries - 1:
+                    wait_time = max(retry_delay * (attempt + 1), e.retry_after or 0)
+                    print(f"遇到速率限制，等待 {wait_time:.0f} 秒后重试...")
+                    await asyncio.sleep(wait_time)
+                    continue
+                else:
+                    print("达到最大重试次数，跳过此文章")
+                    return None
             except Exception as e:
                 if attempt < max_retries - 1:
                     print(f"总结文章失败: {article['title']}, 错误: {e}, 将重试...")
@@ -532,10 +1095,11 @@ class PodcastGenerator:
 
     async def summarize_articles(self, articles: List[Dict]) -> List[Dict]:
         """并行总结多篇文章，处理速率限制"""
+        self.require_api_key()
         print(f"\n开始总结 {len(articles)} 篇文章...")
         
         # 每批处理的文章数
-        batch_size = 15  # 考虑到免费版每分钟20次的限制
+        batch_size = self.summary_calls_per_minute
         summaries = []
         
         for i in range(0, len(articles), batch_size):
@@ -557,19 +1121,104 @@ class PodcastGenerator:
         print(f"完成 {len(summaries)} 篇文章的总结")
         return summaries
 
+    def pending_fetch_budget(self, pending_summaries: List[Dict]) -> tuple[int, float]:
+        """根据待播出的总结计算本次最多抓取的篇数和最低得分
+
+        一期节目最多播出 top_k 篇，待播出的总结不足 top_k 篇时只补足差额；
+        已满 top_k 篇时，只有得分高于第 top_k 高的待播出总结的文章才值得抓取和总结。
+
+        Returns:
+            tuple: (最多抓取的篇数, 最低得分，None 表示不限)
+        """
+        top_k = self.load_scoring_config()['top_k']
+        scores = sorted((s.get('score') or 0 for s in pending_summaries), reverse=True)
+        if len(scores) < top_k:
+            return top_k - len(scores), None
+        return top_k, scores[top_k - 1]
+
+    async def ingest_once(self) -> int:
+        """后台模式的一次轮询：获取新文章并逐篇总结，结果立即写入总结存储
+
+        每次调用之间按 summary_calls_per_minute 均匀间隔，避免集中触发速率限制。
+        只抓取有机会进入下一期节目的文章，见 pending_fetch_budget。
+        总结失败的文章会从文章缓存中移除，以便下次轮询重试。
+        """
+        self.require_api_key()
+        top_k, min_score = self.pending_fetch_budget(self.get_pending_summaries(self.load_summary_store()))
+        articles = await asyncio.to_thread(self.fetch_rss_articles, top_k=top_k, min_score=min_score)
+        if not articles:
+            print("本次轮询没有新文章")
+            return 0
+
+        call_interval = 60 / self.summary_calls_per_minute
+        added = 0
+        for i, article in enumerate(articles):
+            if i > 0:
+                await asyncio.sleep(call_interval)
+
+            summary = await self.summarize_single_article(article)
+            if summary is None:
+                await asyncio.to_thread(self.clear_cache_entry, article['link'])
+                continue
+
+            # 每篇总结完成后立即保存，进程中断也不会丢失已完成的工作
+            store = self.load_summary_store()
+            self.add_summary_to_store(summary, store)
+            self.save_summary_store(store)
+            added += 1
+            print(f"已预先总结: {article['title']}")
+
+        print(f"本次轮询完成 {added}/{len(articles)} 篇文章的总结")
+        self.report_llm_stats()
+        return added
+
+    async def run_daemon(self, poll_interval: int = None, once: bool = False):
+        """后台常驻模式：全天定时轮询 RSS，提前完成抓取和总结
+
+        每日构建时只需从总结存储中取出待播出的总结生成播报稿和音频。
+        """
+        poll_interval = poll_interval or self.daemon_poll_interval
+        print(f"后台模式启动，轮询间隔 {poll_interval} 秒")
+        while True:
+            started = time.monotonic()
+            try:
+                await self.ingest_once()
+            except Exception as e:
+                print(f"后台轮询失败: {e}")
+                import traceback
+                print(traceback.format_exc())
+
+            if once:
+                return
+
+            elapsed = time.monotonic() - started
+            wait_time = max(0, poll_interval - elapsed)
+            print(f"下次轮询将在 {int(wait_time)} 秒后开始")
+            await asyncio.sleep(wait_time)
+
     def clear_cache_entry(self, url):
         """删除缓存中的特定文章记录"""
         try:
             cache = self.load_cache()
             if url in cache['articles']:
                 del cache['articles'][url]
-                self.save_cache(cache)
+                self.save_cache(cache, removed_urls=[url])
                 print(f"已删除缓存记录: {url}")
             else:
                 print(f"未找到缓存记录: {url}")
         except Exception as e:
             print(f"删除缓存记录失败: {e}")
 
+    def release_failed_articles(self, articles: List[Dict], summaries: List[Dict]):
+        """从文章缓存中移除总结失败的文章
+
+        抓取时文章已写入缓存，不移除的话之后 7 天内都会被当作已处理而跳过。
+        """
+        summarized = {s['link'] for s in summaries}
+        for article in articles:
+            if article['link'] not in summarized:
+                self.clear_cache_entry(article['link'])
+
     def format_datetime(self, datetime_str: str) -> str:
         """将各种格式的时间转换为统一的中文格式"""
         try:
@@ -587,16 +1236,17 @@ class PodcastGenerator:
         
         return dt.strftime('%Y年%m月%d日 %H:%M')
 
-    async def generate_final_summary(self, summaries: List[Dict], timestamp: str) -> str:
-        """生成最终的汇总摘要和播报稿"""
+    def render_episode_files(self, summaries: List[Dict], timestamp: str) -> str:
+        """将总结和原文写入 summary.txt、summary.html 和 articles.txt"""
         try:
             podcast_dir = os.path.join(self.podcasts_dir, timestamp)
+            if not os.path.exists(podcast_dir):
+                os.makedirs(podcast_dir)
             
             # 保存总结到正确位置
             summary_file = os.path.join(podcast_dir, 'summary.txt')
             summary_html = os.path.join(podcast_dir, 'summary.html')  # 新增HTML文件
             articles_file = os.path.join(podcast_dir, 'articles.txt')
-            script_file = os.path.join(podcast_dir, 'script.txt')
             
             # 保存总结和原文
             with open(summary_file, 'w', encoding='utf-8') as f_summary, \
@@ -656,10 +1306,13 @@ class PodcastGenerator:
                     f_articles.write(f"来源：{s['source']}\n")
                     f_articles.write(f"原文链接：{s['link']}\n")
                     f_articles.write(f"发布时间：{formatted_time}\n")
-                    f_articles.write(f"原文：\n{s.get('content', '未获取到原文')}\n")
+                    f_articles.write("原文：\n")
+                    self.copy_article_body(s, f_articles)
+                    f_articles.write("\n")
                     f_articles.write("\n" + "="*50 + "\n\n")
                     
                     # 写入HTML格式
+                    summary_text = s['summary'].replace('\n', '<br>').replace('*', '').replace('#', '')
                     f_html.write(f"""
     <div style="margin-bottom: 30px; padding: 15px 0; border-bottom: 1px solid #ddd;">
         <div style="font-size: 1.4em; font-weight: bold; margin-bottom: 10px; color: #2c3e50;">文章{i}/{len(summaries)}: {s['title']}</div>
@@ -670,7 +1323,7 @@ class PodcastGenerator:
         </div>
         <div style="margin-top: 15px; line-height: 1.7; text-align: justify;">
             <strong>总结：</strong><br>
-            {s['summary'].replace('\n', '<br>').replace('*', '').replace('#', '')}
+            {summary_text}
         </div>
     </div>
 """)
@@ -683,15 +1336,25 @@ class PodcastGenerator:
 </body>
 </html>
 """)
-            
-            # 生成播报稿
-            article_count = len(summaries)
-            input_text = "\n\n".join([
-                f"文章{i+1}:\n标题: {s['title']}\n来源: {s['source']}\n总结:\n{s['summary']}"
-                for i, s in enumerate(summaries)
-            ])
-            
-            prompt = f"""你是出版电台的主播，需要将以下{article_count}篇文章整理成适合朗读的播报内容。
+
+            self.record_published_files([summary_file, summary_html, articles_file])
+            return summary_file
+
+        except Exception as e:
+            print(f"写入总结文件失败: {e}")
+            import traceback
+            print(traceback.format_exc())
+            return None
+
+    def build_script_prompt(self, summaries: List[Dict], variant: Dict = None) -> str:
+        """生成播报稿的提示词，版本可以用自己的提示词模板"""
+        article_count = len(summaries)
+        input_text = "\n\n".join([
+            f"文章{i+1}:\n标题: {s['title']}\n来源: {s['source']}\n总结:\n{s['summary']}"
+            for i, s in enumerate(summaries)
+        ])
+        
+        prompt = f"""你是出版电台的主播，需要将以下{article_count}篇文章整理成适合朗读的播报内容。
 
 内容材料：
 {input_text}
@@ -712,64 +1375,175 @@ class PodcastGenerator:
 
 请直接输出播报内容。
 """
+        prompt_template = self.load_variant_prompt(variant or {})
+        if prompt_template:
+            prompt = prompt_template.format(article_count=article_count, input_text=input_text)
+        return prompt
 
-            # 修改 highlight 生成部分，使用固定格式
-            # 在 generate_final_summary 方法中，替换现有的 highlight 生成逻辑
+    async def request_broadcast_script(self, prompt: str) -> str:
+        """请求生成播报稿，同一次运行中相同的提示词只请求一次
 
-            # 使用简单直接的固定格式
-            highlight = f"您好，今天为您准备了{len(summaries)}篇出版行业的新鲜资讯，请您查收。"
+        只有音色或码率不同的版本文章和提示词完全相同，共用同一个请求的结果，
+        不必为每个版本重复调用大模型。
+        """
+        task = self._script_requests.get(prompt)
+        if task is None:
+            task = asyncio.ensure_future(self._complete_script(prompt))
+            self._script_requests[prompt] = task
+        try:
+            return await task
+        except Exception:
+            # 失败的请求不保留，重新运行该阶段时可以再次请求
+            if self._script_requests.get(prompt) is task:
+                del self._script_requests[prompt]
+            raise
 
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
+    async def _complete_script(self, prompt: str) -> str:
+        import aiohttp
 
-            # 生成播报稿
-            async with aiohttp.ClientSession() as session:
-                broadcast_response = await session.post(
-                    self.api_base,
-                    headers=headers,
-                    json={
-                        "model": "google/gemini-2.0-flash-001",
-                        "messages": [{"role": "user", "content": prompt}]
-                    },
-                    timeout=180
-                )
-                
-                broadcast_result = await broadcast_response.json()
-                if 'choices' in broadcast_result:
-                    broadcast_script = broadcast_result["choices"][0]["message"]["content"].strip()
-                elif 'response' in broadcast_result:
-                    broadcast_script = broadcast_result["response"].strip()
-                else:
-                    print(f"API响应格式异常: {broadcast_result}")
-                    return None
+        # 超过观测到的 p90 耗时会向备用模型发送对冲请求
+        async with aiohttp.ClientSession() as session:
+            return await self.get_llm_client().complete(session, prompt, timeout=180, kind='script')
+
+    async def generate_broadcast_script(self, summaries: List[Dict], timestamp: str, variant: Dict = None) -> str:
+        """调用大模型生成播报稿并保存到 script.txt"""
+        from llm_client import LLMRequestError
+
+        try:
+            script_file = os.path.join(self.podcasts_dir, timestamp, 'script.txt')
+            prompt = self.build_script_prompt(summaries, variant)
+
+            try:
+                broadcast_script = await self.request_broadcast_script(prompt)
+            except LLMRequestError as e:
+                print(f"API响应格式异常: {e}")
+                return None
 
             # 保存播报稿
             with open(script_file, 'w', encoding='utf-8') as f:
                 f.write(broadcast_script)
+            self.record_published_files([script_file])
+
+            return broadcast_script
+
+        except Exception as e:
+            print(f"生成播报稿失败: {e}")
+            import traceback
+            print(traceback.format_exc())
+            return None
+
+    def list_audio_renditions(self, timestamp: str, mp3_bitrate: int = 192) -> List[Dict]:
+        """列出节目目录中所有码率的音频及其大小，按码率从高到低排列"""
+        podcast_dir = os.path.join(self.podcasts_dir, timestamp)
+        renditions = []
+        for name in os.listdir(podcast_dir):
+            if name == 'podcast.mp3':
+                bitrate = mp3_bitrate
+            elif name.startswith('podcast_') and name.endswith('k.mp3'):
+                bitrate = int(name[len('podcast_'):-len('k.mp3')])
+            else:
+                continue
+            renditions.append({
+                'bitrate': bitrate,
+                'path': f'./podcasts/{timestamp}/{name}',
+                'size': os.path.getsize(os.path.join(podcast_dir, name))
+            })
+        renditions.sort(key=lambda r: r['bitrate'], reverse=True)
+        return renditions
+
+    def load_variant_prompt(self, variant: Dict) -> str:
+        """读取版本的提示词模板，可使用 {article_count} 和 {input_text} 占位符"""
+        if variant.get('prompt_file'):
+            with open(variant['prompt_file'], 'r', encoding='utf-8') as f:
+                return f.read()
+        return variant.get('prompt')
+
+    def build_podcast_data(self, timestamp: str, article_count: int, has_audio: bool = None, variant: Dict = None) -> Dict:
+        """构建索引条目，未指定 has_audio 时根据节目目录中是否有音频文件判断"""
+        variant = variant or {}
+        try:
+            episode_time = datetime.strptime(timestamp[:15], "%Y%m%d_%H%M%S")
+        except ValueError:
+            episode_time = datetime.now()
+
+        if has_audio is None:
+            has_audio = os.path.exists(os.path.join(self.podcasts_dir, timestamp, 'podcast.mp3'))
+        audio_path = f'./podcasts/{timestamp}/podcast.mp3' if has_audio else None
+        audio_renditions = self.list_audio_renditions(timestamp, variant.get('mp3_bitrate', 192)) if has_audio else []
+
+        # 使用简单直接的固定格式
+        highlight = f"您好，今天为您准备了{article_count}篇出版行业的新鲜资讯，请您查收。"
+
+        return {
+            'id': timestamp,
+            'date': episode_time.strftime('%Y-%m-%d'),
+            'title': f"{variant.get('title', '出版电台播报')} {episode_time.strftime('%Y年%m月%d日')}",
+            'transcript_path': f'./podcasts/{timestamp}/summary.html',  # 修改为HTML文件
+            'audio_path': audio_path,  # 保持 ./ 前缀
+            'audio_renditions': audio_renditions,
+            'highlight': highlight,  # 添加广播式副标题
+            'variant': variant.get('name')
+        }
 
+    async def render_variant(self, summaries: List[Dict], timestamp: str, variant: Dict, with_audio: bool = True) -> Dict:
+        """为一个版本生成文稿、播报稿和音频，返回它的索引条目"""
+        episode_id = self.variant_episode_id(timestamp, variant)
+        selected = self.select_variant_summaries(summaries, variant)
+        if not selected:
+            print(f"版本 {variant['name']} 没有符合条件的文章，跳过")
+            return None
+
+        print(f"\n生成版本 {variant['name']} ({len(selected)} 篇文章) -> {episode_id}")
+        if not self.render_episode_files(selected, episode_id):
+            return None
+
+        broadcast_script = await self.generate_broadcast_script(selected, episode_id, variant)
+        if not broadcast_script:
+            return None
+
+        audio_file = None
+        if with_audio:
             # 生成音频
-            audio_file = await self.generate_audio(broadcast_script, timestamp)
+            audio_file = await self.generate_audio(
+                broadcast_script, episode_id,
+                reference_id=variant.get('reference_id'),
+                mp3_bitrate=variant.get('mp3_bitrate', 192),
+                renditions=variant.get('renditions')
+            )
             if not audio_file:
-                print("音频生成失败")
-                audio_path = None
+                print(f"版本 {variant['name']} 音频生成失败")
             else:
                 print(f"音频生成成功: {audio_file}")
-                audio_path = f'./podcasts/{timestamp}/podcast.mp3'
+
+        return {
+            'podcast_data': self.build_podcast_data(episode_id, len(selected), bool(audio_file), variant),
+            'summaries': selected
+        }
+
+    async def generate_final_summary(self, summaries: List[Dict], timestamp: str, store: Dict = None) -> str:
+        """生成最终的汇总摘要和播报稿
+
+        抓取和总结的结果只计算一次，各版本的播报稿和音频并发生成。
+        传入 store 时，将每个版本用到的总结记录到总结存储中。
+        """
+        try:
+            variants = self.load_episode_variants()
+            results = await asyncio.gather(*[
+                self.render_variant(summaries, timestamp, variant) for variant in variants
+            ])
+
+            # 主版本失败时总结仍为待播出，其他版本也不发布，否则重新运行时会以新的时间戳重复发布
+            if not results[0]:
+                print("主版本生成失败，本次各版本都不更新索引")
+                return None
 
             # 更新索引
-            podcast_data = {
-                'id': timestamp,
-                'date': datetime.now().strftime('%Y-%m-%d'),
-                'title': f"出版电台播报 {datetime.now().strftime('%Y年%m月%d日')}",
-                'transcript_path': f'./podcasts/{timestamp}/summary.html',  # 修改为HTML文件
-                'audio_path': audio_path,  # 保持 ./ 前缀
-                'highlight': highlight  # 添加广播式副标题
-            }
-            self.update_podcast_index(podcast_data)
-            
-            return summary_file
+            self.update_podcast_index_entries([r['podcast_data'] for r in results if r])
+
+            if store is not None:
+                self.record_variant_results(summaries, results, store)
+
+            return os.path.join(self.podcasts_dir, timestamp, 'summary.txt')
 
         except Exception as e:
             print(f"生成播报稿失败: {e}")
@@ -778,37 +1552,240 @@ class PodcastGenerator:
             return None
 
 async def main():
-    """主函数"""
+    """主函数：完整运行所有阶段"""
     generator = PodcastGenerator()
-    
-    # 1. 获取文章
-    articles = generator.fetch_rss_articles()
-    if not articles:
+    generator.require_api_key()
+    generator.require_fish_api_key()
+
+    # 1. 取出后台模式已预先总结好的文章
+    store = generator.load_summary_store()
+    pending_summaries = generator.get_pending_summaries(store)
+    if pending_summaries:
+        print(f"使用 {len(pending_summaries)} 篇已预先总结的文章")
+
+    # 2. 获取尚未处理、且有机会进入本期节目的新文章
+    top_k, min_score = generator.pending_fetch_budget(pending_summaries)
+    articles = generator.fetch_rss_articles(top_k=top_k, min_score=min_score)
+    if not articles and not pending_summaries:
         print("未获取到文章")
         return
-    
-    # 2. 创建时间戳目录
+
+    # 3. 创建时间戳目录
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     podcast_dir = os.path.join(generator.podcasts_dir, timestamp)
     if not os.path.exists(podcast_dir):
         os.makedirs(podcast_dir)
-        
-    # 3. 并行总结文章
-    summaries = await generator.summarize_articles(articles)
+
+    # 4. 并行总结剩余的新文章，并存入总结存储以便之后重新渲染
+    summaries = list(pending_summaries)
+    if articles:
+        new_summaries = await generator.summarize_articles(articles)
+        for summary in new_summaries:
+            generator.add_summary_to_store(summary, store)
+        generator.save_summary_store(store)
+        generator.release_failed_articles(articles, new_summaries)
+        summaries.extend(new_summaries)
     if not summaries:
         print("文章总结失败")
         return
-        
-    # 4. 生成最终播报稿
-    summary_file = await generator.generate_final_summary(summaries, timestamp)
+
+    # 5. 生成各版本的播报稿和音频
+    summary_file = await generator.generate_final_summary(summaries, timestamp, store)
+    generator.save_summary_store(store)
+    generator.report_llm_stats()
     if not summary_file:
         print("生成播报稿失败")
         return
-    
+
     print("\n处理完成!")
     print(f"文件已保存在: {summary_file}")
 
+async def cmd_fetch(generator: PodcastGenerator, args):
+    """fetch 阶段：获取新文章并暂存"""
+    articles = generator.fetch_rss_articles(top_k=args.top_k)
+    generator.save_staged_articles(articles)
+
+async def cmd_summarize(generator: PodcastGenerator, args):
+    """summarize 阶段：总结暂存的文章，结果记为待播出"""
+    generator.require_api_key()
+    articles = generator.load_staged_articles()
+    if not articles:
+        print("没有暂存的文章，请先运行 fetch")
+        return
+
+    summaries = await generator.summarize_articles(articles)
+    store = generator.load_summary_store()
+    for summary in summaries:
+        generator.add_summary_to_store(summary, store)
+    generator.save_summary_store(store)
+    # 总结失败的文章移出缓存，下次 fetch 时可以重新选取
+    generator.release_failed_articles(articles, summaries)
+    os.remove(generator.staged_articles_file)
+    print(f"已保存 {len(summaries)}/{len(articles)} 篇总结，待生成播报稿")
+    generator.report_llm_stats()
+
+async def cmd_script(generator: PodcastGenerator, args):
+    """script 阶段：用所有待播出的总结为每个版本生成文稿和播报稿"""
+    generator.require_api_key()
+    store = generator.load_summary_store()
+    summaries = generator.get_pending_summaries(store)
+    if not summaries:
+        print("没有待播出的总结")
+        return
+
+    timestamp = args.timestamp or datetime.now().strftime("%Y%m%d_%H%M%S")
+    results = await asyncio.gather(*[
+        generator.render_variant(summaries, timestamp, variant, with_audio=False)
+        for variant in generator.load_episode_variants()
+    ])
+    generator.report_llm_stats()
+    rendered = [r for r in results if r]
+    if not rendered:
+        return
+
+    primary_ok = generator.record_variant_results(summaries, results, store)
+    generator.save_summary_store(store)
+    if not primary_ok:
+        print("主版本生成失败，总结仍保留为待播出")
+        return
+    print(f"播报稿已生成，节目时间戳: {timestamp}")
+
+async def cmd_tts(generator: PodcastGenerator, args):
+    """tts 阶段：将一次运行中各版本的播报稿并发转换为音频"""
+    generator.require_fish_api_key()
+    tasks = []
+    for episode_id in generator.episode_ids_for_run(args.timestamp):
+        script_file = os.path.join(generator.podcasts_dir, episode_id, 'script.txt')
+        if not os.path.exists(script_file):
+            print(f"未找到播报稿: {script_file}")
+            continue
+
+        variant = generator.variant_for_episode(episode_id)
+        with open(script_file, 'r', encoding='utf-8') as f:
+            tasks.append(generator.generate_audio(
+                f.read(), episode_id,
+                reference_id=variant.get('reference_id'),
+                mp3_bitrate=variant.get('mp3_bitrate', 192),
+                renditions=variant.get('renditions')
+            ))
+
+    if not tasks:
+        print("没有需要生成音频的播报稿")
+        return
+    await asyncio.gather(*tasks)
+
+async def cmd_render(generator: PodcastGenerator, args):
+    """render 阶段：根据已保存的总结重新生成一次运行中各版本的文稿"""
+    store = generator.load_summary_store()
+    for episode_id in generator.episode_ids_for_run(args.timestamp):
+        summaries = generator.get_episode_summaries(store, episode_id)
+        if not summaries:
+            print(f"总结存储中没有节目 {episode_id} 的总结")
+            continue
+
+        summary_file = generator.render_episode_files(summaries, episode_id)
+        if summary_file:
+            print(f"文稿已重新生成: {summary_file}")
+
+async def cmd_index(generator: PodcastGenerator, args):
+    """index 阶段：根据一次运行中各版本的已有文件更新播客索引"""
+    episode_ids = generator.episode_ids_for_run(args.timestamp)
+    if not episode_ids:
+        print("没有可索引的节目")
+        return
+
+    # 主版本没有播报稿说明 script 阶段失败，总结仍为待播出，其他版本也不发布
+    primary_id = episode_ids[0][:15]
+    if not os.path.exists(os.path.join(generator.podcasts_dir, primary_id, 'script.txt')):
+        print(f"节目 {primary_id} 的主版本没有播报稿，不更新索引")
+        return
+
+    store = generator.load_summary_store()
+    entries = []
+    for episode_id in episode_ids:
+        article_count = generator.episode_article_count(store, episode_id)
+        if article_count is None:
+            # 不用 0 覆盖索引中已有的条目
+            print(f"无法确定节目 {episode_id} 的文章数，跳过")
+            continue
+        entries.append(generator.build_podcast_data(
+            episode_id, article_count, variant=generator.variant_for_episode(episode_id)
+        ))
+    if entries:
+        generator.update_podcast_index_entries(entries)
+
+async def cmd_cache_prune(generator: PodcastGenerator, args):
+    """cache prune：清理过期的文章缓存、已播出的总结和不再使用的原文"""
+    generator.save_cache(generator.load_cache())
+    store = generator.load_summary_store()
+    generator.save_summary_store(store)
+    generator.prune_article_bodies(store)
+
+async def cmd_sync(generator: PodcastGenerator, args):
+    """sync：把发布清单中新增或修改的文件复制到发布目录"""
+    # 网页本身随代码修改，不经过生成器，同步前记入清单，内容未变时不会复制
+    static_files = [os.path.join(generator.public_dir, f) for f in generator.static_public_files]
+    generator.record_published_files([f for f in static_files if os.path.exists(f)])
+
+    if not os.path.exists(generator.publish_manifest_file):
+        print("发布清单为空，没有需要同步的文件")
+        report = {'new': [], 'changed': []}
+    else:
+        report = generator.sync_published_files(args.target, args.keep)
+
+    if args.changed_list:
+        with open(args.changed_list, 'w', encoding='utf-8') as f:
+            for relpath in report['new'] + report['changed']:
+                f.write(relpath + '\n')
+
+async def cmd_daemon(generator: PodcastGenerator, args):
+    """daemon：后台常驻，全天轮询并预先总结文章"""
+    await generator.run_daemon(args.interval, args.once)
+
+def build_parser():
+    """构建命令行参数，每个子命令只导入和要求它所在阶段需要的依赖和密钥"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="出版电台播客生成，不带子命令时完整运行所有阶段")
+    subparsers = parser.add_subparsers(dest='command')
+
+    fetch = subparsers.add_parser('fetch', help='按得分选取新文章并暂存')
+    fetch.add_argument('--top-k', type=int, default=None, help='最多选取的文章数，默认使用评分配置')
+    fetch.set_defaults(handler=cmd_fetch)
+    subparsers.add_parser('summarize', help='总结暂存的文章 (需要 API_KEY)').set_defaults(handler=cmd_summarize)
+
+    for name, handler, help_text in [
+        ('script', cmd_script, '用待播出的总结生成文稿和播报稿 (需要 API_KEY)'),
+        ('tts', cmd_tts, '将播报稿转换为音频 (需要 FISH_API_KEY)'),
+        ('render', cmd_render, '根据已保存的总结重新生成文稿'),
+        ('index', cmd_index, '根据节目目录更新播客索引'),
+    ]:
+        stage = subparsers.add_parser(name, help=help_text)
+        stage.add_argument('--timestamp', help='运行时间戳或单个版本的节目 ID，默认为最近一次运行 (script 默认为当前时间)')
+        stage.set_defaults(handler=handler)
+
+    cache = subparsers.add_parser('cache', help='缓存维护')
+    cache_commands = cache.add_subparsers(dest='cache_command', required=True)
+    cache_commands.add_parser('prune', help='清理过期的缓存条目').set_defaults(handler=cmd_cache_prune)
+
+    sync = subparsers.add_parser('sync', help='只把新增或修改的文件复制到发布目录')
+    sync.add_argument('--target', required=True, help='发布目录，例如 gh-pages 分支的工作目录')
+    sync.add_argument('--changed-list', help='将复制的文件路径（相对于发布目录）写入此文件')
+    sync.add_argument('--keep', action='store_true', help='同步后保留发布清单')
+    sync.set_defaults(handler=cmd_sync)
+
+    daemon = subparsers.add_parser('daemon', help='后台常驻模式，全天轮询并预先总结文章')
+    daemon.add_argument('--interval', type=int, default=None, help='轮询间隔(秒)')
+    daemon.add_argument('--once', action='store_true', help='只轮询一次后退出')
+    daemon.set_defaults(handler=cmd_daemon)
+
+    return parser
+
 if __name__ == "__main__":
-    
+    args = build_parser().parse_args()
+
     # 运行异步主函数
-    asyncio.run(main()) 
+    if args.command is None:
+        asyncio.run(main())
+    else:
+        asyncio.run(args.handler(PodcastGenerator(), args))
@@ -0,0 +1,207 @@
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from typing import Dict
+
+import aiohttp
+
+
+class LLMRequestError(Exception):
+    """大模型接口返回了错误或无法解析的响应
+
+    rate_limited 表示遇到速率限制或所有模型都在熔断中，调用方应等待 retry_after 秒
+    （未给出时按自己的退避策略）后重试，而不是放弃这次请求。
+    """
+
+    def __init__(self, message: str, rate_limited: bool = False, retry_after: float = None):
+        super().__init__(message)
+        self.rate_limited = rate_limited
+        self.retry_after = retry_after
+
+
+class HedgedLLMClient:
+    """带对冲请求和熔断的 OpenRouter 调用
+
+    请求耗时超过同类请求的 p90 时，再发一个相同的请求（配置了备用模型时发给备用模型），
+    取先返回的结果并取消另一个。某个模型连续失败达到阈值后暂停向它发送请求。
+    每个客户端每分钟最多发送 max_hedges_per_minute 个对冲请求，超出时只等待原请求。
+    """
+
+    def __init__(self, api_base: str, api_key: str, model: str, fallback_model: str = None,
+                 default_hedge_delays: Dict[str, float] = None, min_samples: int = 5,
+                 failure_threshold: int = 3, cooldown: float = 120, max_hedges_per_minute: int = 5):
+        self.api_base = api_base
+        self.api_key = api_key
+        self.model = model
+        self.fallback_model = fallback_model
+        # 样本不足时使用的对冲等待时间(秒)，按请求类型区分
+        self.default_hedge_delays = default_hedge_delays or {'summary': 15, 'script': 90}
+        self.min_samples = min_samples
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_hedges_per_minute = max_hedges_per_minute
+        self.hedge_times = deque()  # 最近一分钟内发送对冲请求的时间
+
+        self.latencies = {}  # 请求类型 -> 最近的成功耗时
+        self.failures = {}  # 模型 -> 连续失败次数
+        self.open_until = {}  # 模型 -> 熔断结束时间
+        self.stats = {'requests': 0, 'hedged': 0, 'hedge_wins': 0, 'hedge_skipped': 0,
+                      'saved_seconds': 0.0, 'unestimated_wins': 0}
+
+    def load_latency_samples(self, path: str):
+        """加载以往运行保存的耗时样本，使每次运行都能使用观测到的 p90"""
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for kind, samples in json.load(f).items():
+                    self.latencies[kind] = deque(samples, maxlen=100)
+        except Exception as e:
+            print(f"加载大模型耗时样本失败: {e}")
+
+    def save_latency_samples(self, path: str):
+        """保存最近的耗时样本，供之后的运行使用"""
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump({kind: [round(x, 3) for x in samples] for kind, samples in self.latencies.items()},
+                          f, indent=2)
+        except Exception as e:
+            print(f"保存大模型耗时样本失败: {e}")
+
+    def percentile(self, kind: str, q: float) -> float:
+        """某类请求最近耗时的分位数，样本不足时返回 None"""
+        samples = sorted(self.latencies.get(kind, []))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def hedge_delay(self, kind: str) -> float:
+        """发送对冲请求前的等待时间：观测到的 p90 耗时"""
+        p90 = self.percentile(kind, 0.9)
+        return p90 if p90 is not None else self.default_hedge_delays.get(kind, 30)
+
+    def take_hedge_budget(self) -> bool:
+        """占用一次对冲配额，最近一分钟内已达上限时返回 False"""
+        now = time.monotonic()
+        while self.hedge_times and now - self.hedge_times[0] >= 60:
+            self.hedge_times.popleft()
+        if len(self.hedge_times) >= self.max_hedges_per_minute:
+            return False
+        self.hedge_times.append(now)
+        return True
+
+    def is_available(self, model: str) -> bool:
+        """模型是否未处于熔断状态"""
+        return bool(model) and time.monotonic() >= self.open_until.get(model, 0)
+
+    def record_failure(self, model: str):
+        self.failures[model] = self.failures.get(model, 0) + 1
+        if self.failures[model] >= self.failure_threshold:
+            self.open_until[model] = time.monotonic() + self.cooldown
+            print(f"模型 {model} 连续失败 {self.failures[model]} 次，暂停使用 {self.cooldown} 秒")
+
+    def record_success(self, model: str, kind: str, latency: float):
+        self.failures[model] = 0
+        self.latencies.setdefault(kind, deque(maxlen=100)).append(latency)
+
+    async def _request(self, session: aiohttp.ClientSession, model: str, prompt: str,
+                       timeout: float, kind: str) -> str:
+        """向指定模型发送一次请求并返回文本内容"""
+        started = time.monotonic()
+        try:
+            async with session.post(
+                self.api_base,
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json"
+                },
+                json={
+                    "model": model,
+                    "messages": [{"role": "user", "content": prompt}]
+                },
+                timeout=aiohttp.ClientTimeout(total=timeout)
+            ) as response:
+                result = await response.json()
+
+            if 'error' in result:
+                raise LLMRequestError(f"{model}: {result['error']}",
+                                      rate_limited=result['error'].get('code') == 429)
+            if 'choices' in result:
+                content = result["choices"][0]["message"]["content"].strip()
+            elif 'response' in result:
+                content = result["response"].strip()
+            else:
+                raise LLMRequestError(f"{model}: {result}")
+        except asyncio.CancelledError:
+            raise
+        except LLMRequestError as e:
+            # 速率限制是配额问题，不代表模型不可用，不计入熔断
+            if not e.rate_limited:
+                self.record_failure(model)
+            raise
+        except Exception:
+            self.record_failure(model)
+            raise
+
+        self.record_success(model, kind, time.monotonic() - started)
+        return content
+
+    async def complete(self, session: aiohttp.ClientSession, prompt: str,
+                       timeout: float, kind: str = 'summary') -> str:
+        """发送请求，超过 p90 耗时仍未返回时发送对冲请求，返回先完成的结果"""
+        candidates = [m for m in (self.model, self.fallback_model) if self.is_available(m)]
+        if not candidates:
+            retry_after = min(self.open_until.values()) - time.monotonic()
+            raise LLMRequestError("所有模型都处于熔断状态", rate_limited=True, retry_after=max(0.0, retry_after))
+        primary_model = candidates[0]
+        hedge_model = candidates[-1]
+
+        self.stats['requests'] += 1
+        started = time.monotonic()
+        primary = asyncio.create_task(self._request(session, primary_model, prompt, timeout, kind))
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_delay(kind))
+        if done:
+            return primary.result()
+
+        if not self.take_hedge_budget():
+            self.stats['hedge_skipped'] += 1
+            return await primary
+
+        self.stats['hedged'] += 1
+        hedge = asyncio.create_task(self._request(session, hedge_model, prompt, timeout, kind))
+        pending = {primary, hedge}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+
+                    if task is hedge:
+                        elapsed = time.monotonic() - started
+                        self.stats['hedge_wins'] += 1
+                        # 主请求已被取消，用观测到的 p99 估算它原本需要的时间，样本不足时不估算
+                        tail = self.percentile(kind, 0.99)
+                        if tail is None:
+                            self.stats['unestimated_wins'] += 1
+                        else:
+                            self.stats['saved_seconds'] += max(0.0, tail - elapsed)
+                    return task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+        raise error
+
+    def report(self) -> str:
+        """对冲比例和估计节省的时间，用于权衡额外的调用成本"""
+        requests = self.stats['requests']
+        hedge_rate = self.stats['hedged'] / requests if requests else 0
+        return (f"大模型请求 {requests} 次，对冲 {self.stats['hedged']} 次 ({hedge_rate:.0%})，"
+                f"对冲请求先返回 {self.stats['hedge_wins']} 次，"
+                f"因配额跳过对冲 {self.stats['hedge_skipped']} 次，"
+                f"估计节省 {self.stats['saved_seconds']:.1f} 秒"
+                f"（{self.stats['unestimated_wins']} 次因样本不足未估算）")